@@ -10,12 +10,63 @@ import numpy as np
 from datetime import datetime, timedelta
 import json
 import requests
+from collections import deque
 from typing import Dict, List, Optional, Any
+from string import Template
 import plotly.graph_objects as go
-import plotly.express as px
 import warnings
 warnings.filterwarnings('ignore')
 
+# Notification card markup and severity border colours, parsed once at import
+_NOTIFICATION_TPL = Template("""
+            <div style="background: linear-gradient(135deg, #1a1a1a 0%, #2a2a2a 100%);
+                        border: 1px solid $color;
+                        border-radius: 8px;
+                        padding: 1rem;
+                        margin: 0.5rem 0;
+                        color: white;">
+                <strong>$title</strong><br>
+                $message<br>
+                <small style="color: #888;">$timestamp</small>
+            </div>
+            """)
+
+_SEVERITY_COLORS = {
+    'high': '#ff4444',
+    'medium': '#ffaa00',
+    'low': '#00aa00',
+    'info': '#00d4ff'
+}
+
+# Timeline charts are downsampled to this many points before plotting
+MAX_TIMELINE_POINTS = 500
+
+
+def _lttb_indices(values: np.ndarray, threshold: int) -> np.ndarray:
+    """Pick point indices with Largest-Triangle-Three-Buckets downsampling"""
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.arange(n, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) anchors the triangle
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = values[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], values[-1]
+        areas = np.abs((x[prev] - next_x) * (values[start:end] - values[prev])
+                       - (x[prev] - x[start:end]) * (next_y - values[prev]))
+        prev = start + int(np.argmax(areas))
+        selected[i + 1] = prev
+    return selected
+
 class AIChatSupport:
     """
     AI Chat Support following CoinGecko's AI Support guidelines
@@ -222,6 +273,109 @@ class AIPredictiveAnalytics:
         else:
             return "Market showing mixed signals"
     
+    def _portfolio_columns(self, portfolio: List[Dict]) -> Dict:
+        """Collect the per-asset fields used by the predictions, risk metrics and insights in one pass"""
+        symbols, prices, price_changes, allocations, sectors = [], [], [], [], set()
+        for asset in portfolio:
+            symbols.append(asset.get('symbol', 'Unknown'))
+            prices.append(asset.get('current_price', 0))
+            price_changes.append(asset.get('price_change_24h', 0))
+            allocations.append(asset.get('allocation_percentage', 0))
+            if 'sector' in asset:
+                sectors.add(asset['sector'])
+        
+        return {
+            'symbols': symbols,
+            'prices': prices,
+            'price_changes': price_changes,
+            'allocations': np.fromiter(allocations, dtype=np.float64, count=len(allocations)),
+            'abs_price_changes': np.abs(np.fromiter(price_changes, dtype=np.float64, count=len(price_changes))),
+            'sectors': sectors
+        }
+    
+    def _predict(self, columns: Dict) -> List[Dict]:
+        """Trend-based price predictions for the top 5 assets"""
+        predictions = []
+        
+        for symbol, current_price, price_change in list(zip(columns['symbols'], columns['prices'], columns['price_changes']))[:5]:
+            # Simple trend-based prediction
+            if price_change > 5:
+                predicted_price = current_price * 1.05  # 5% increase
+                confidence = 70
+            elif price_change < -5:
+                predicted_price = current_price * 0.95  # 5% decrease
+                confidence = 65
+            else:
+                predicted_price = current_price * 1.02  # 2% increase
+                confidence = 50
+            
+            predictions.append({
+                'asset': symbol,
+                'predicted_price': predicted_price,
+                'confidence': confidence,
+                'trend': 'bullish' if price_change > 0 else 'bearish'
+            })
+        
+        return predictions
+    
+    def _risk(self, columns: Dict) -> Dict:
+        """Diversity, largest position and average volatility (simplified)"""
+        return {
+            'avg_volatility': float(columns['abs_price_changes'].mean()),
+            'diversity': len(columns['symbols']),
+            'largest_position': float(columns['allocations'].max())
+        }
+    
+    def _insights(self, columns: Dict) -> List[Dict]:
+        """Diversification, concentration and sector insights"""
+        insights = []
+        
+        # Diversification insight
+        if len(columns['symbols']) < 5:
+            insights.append({
+                'title': 'Diversification Opportunity',
+                'description': 'Consider adding more assets for better diversification'
+            })
+        
+        # Concentration risk insight
+        max_allocation = float(columns['allocations'].max())
+        if max_allocation > 30:
+            insights.append({
+                'title': 'Concentration Risk',
+                'description': f'Your largest position ({max_allocation:.1f}%) may be too concentrated'
+            })
+        
+        # Sector analysis insight
+        if len(columns['sectors']) < 3:
+            insights.append({
+                'title': 'Sector Diversification',
+                'description': 'Consider diversifying across more sectors'
+            })
+        
+        return insights
+    
+    def analyze(self, portfolio_data: Dict) -> Dict:
+        """Get predictions, risk metrics and insights from a single pass over the portfolio"""
+        analysis = {
+            'predictions': [],
+            'risk': {'avg_volatility': 0.0, 'diversity': 0, 'largest_position': 0.0},
+            'insights': []
+        }
+        
+        try:
+            if not portfolio_data.get('portfolio'):
+                return analysis
+            
+            columns = self._portfolio_columns(portfolio_data['portfolio'])
+            analysis['predictions'] = self._predict(columns)
+            analysis['risk'] = self._risk(columns)
+            analysis['insights'] = self._insights(columns)
+            
+        except Exception as e:
+            st.error(f"❌ Error analyzing portfolio: {str(e)}")
+        
+        return analysis
+    
     def get_portfolio_predictions(self, portfolio_data: Dict) -> List[Dict]:
         """Get AI predictions for portfolio assets"""
         predictions = []
@@ -230,30 +384,7 @@ class AIPredictiveAnalytics:
             if not portfolio_data.get('portfolio'):
                 return predictions
             
-            portfolio = portfolio_data['portfolio']
-            
-            for asset in portfolio[:5]:  # Predict for top 5 assets
-                # Simple prediction based on current data
-                current_price = asset.get('current_price', 0)
-                price_change = asset.get('price_change_24h', 0)
-                
-                # Simple trend-based prediction
-                if price_change > 5:
-                    predicted_price = current_price * 1.05  # 5% increase
-                    confidence = 70
-                elif price_change < -5:
-                    predicted_price = current_price * 0.95  # 5% decrease
-                    confidence = 65
-                else:
-                    predicted_price = current_price * 1.02  # 2% increase
-                    confidence = 50
-                
-                predictions.append({
-                    'asset': asset.get('symbol', 'Unknown'),
-                    'predicted_price': predicted_price,
-                    'confidence': confidence,
-                    'trend': 'bullish' if price_change > 0 else 'bearish'
-                })
+            predictions = self._predict(self._portfolio_columns(portfolio_data['portfolio']))
             
         except Exception as e:
             st.error(f"❌ Error generating portfolio predictions: {str(e)}")
@@ -272,18 +403,7 @@ class AIPredictiveAnalytics:
             if not portfolio_data.get('portfolio'):
                 return risk_metrics
             
-            portfolio = portfolio_data['portfolio']
-            
-            # Calculate diversity (number of assets)
-            risk_metrics['diversity'] = len(portfolio)
-            
-            # Calculate largest position
-            allocations = [asset.get('allocation_percentage', 0) for asset in portfolio]
-            risk_metrics['largest_position'] = max(allocations) if allocations else 0
-            
-            # Calculate average volatility (simplified)
-            price_changes = [abs(asset.get('price_change_24h', 0)) for asset in portfolio]
-            risk_metrics['avg_volatility'] = sum(price_changes) / len(price_changes) if price_changes else 0
+            risk_metrics = self._risk(self._portfolio_columns(portfolio_data['portfolio']))
             
         except Exception as e:
             st.error(f"❌ Error calculating risk metrics: {str(e)}")
@@ -298,36 +418,7 @@ class AIPredictiveAnalytics:
             if not portfolio_data.get('portfolio'):
                 return insights
             
-            portfolio = portfolio_data['portfolio']
-            
-            # Diversification insight
-            if len(portfolio) < 5:
-                insights.append({
-                    'title': 'Diversification Opportunity',
-                    'description': 'Consider adding more assets for better diversification'
-                })
-            
-            # Concentration risk insight
-            allocations = [asset.get('allocation_percentage', 0) for asset in portfolio]
-            max_allocation = max(allocations) if allocations else 0
-            
-            if max_allocation > 30:
-                insights.append({
-                    'title': 'Concentration Risk',
-                    'description': f'Your largest position ({max_allocation:.1f}%) may be too concentrated'
-                })
-            
-            # Sector analysis insight
-            sectors = set()
-            for asset in portfolio:
-                if 'sector' in asset:
-                    sectors.add(asset['sector'])
-            
-            if len(sectors) < 3:
-                insights.append({
-                    'title': 'Sector Diversification',
-                    'description': 'Consider diversifying across more sectors'
-                })
+            insights = self._insights(self._portfolio_columns(portfolio_data['portfolio']))
             
         except Exception as e:
             st.error(f"❌ Error generating portfolio insights: {str(e)}")
@@ -340,7 +431,8 @@ class AISmartNotifications:
     """
     
     def __init__(self):
-        self.notification_history = []
+        # The singleton lives for the whole server process, so keep only the latest alerts
+        self.notification_history = deque(maxlen=100)
         self.alert_thresholds = {
             'price_change': 5.0,  # 5% price change
             'volume_spike': 2.0,   # 2x volume increase
@@ -464,30 +556,22 @@ class AISmartNotifications:
             st.info("No notifications at this time")
             return
         
-        for notification in all_notifications[:5]:  # Show last 5 notifications
-            severity_color = {
-                'high': '#ff4444',
-                'medium': '#ffaa00',
-                'low': '#00aa00',
-                'info': '#00d4ff'
-            }.get(notification.get('severity', 'info'), '#00d4ff')
-            
-            st.markdown(f"""
-            <div style="background: linear-gradient(135deg, #1a1a1a 0%, #2a2a2a 100%);
-                        border: 1px solid {severity_color};
-                        border-radius: 8px;
-                        padding: 1rem;
-                        margin: 0.5rem 0;
-                        color: white;">
-                <strong>{notification.get('title', notification.get('type', 'Notification'))}</strong><br>
-                {notification.get('message', '')}<br>
-                <small style="color: #888;">{notification.get('timestamp', '')}</small>
-            </div>
-            """, unsafe_allow_html=True)
+        # Build every card first and emit them as a single markdown element
+        cards = "".join(
+            _NOTIFICATION_TPL.substitute(
+                color=_SEVERITY_COLORS.get(notification.get('severity', 'info'), '#00d4ff'),
+                title=notification.get('title', notification.get('type', 'Notification')),
+                message=notification.get('message', ''),
+                timestamp=notification.get('timestamp', '')
+            )
+            for notification in all_notifications[:5]  # Show last 5 notifications
+        )
+        
+        st.markdown(cards, unsafe_allow_html=True)
     
     def get_notification_history(self) -> List[Dict]:
         """Get notification history for display"""
-        return self.notification_history
+        return list(self.notification_history)
     
     def send_price_alert(self, asset: str, price: float, change_percent: float):
         """Send a price alert notification"""
@@ -547,8 +631,8 @@ class AIEnhancedVisualizations:
             
             # Prepare data
             symbols = [asset['symbol'] for asset in portfolio]
-            allocations = [asset['allocation_percentage'] for asset in portfolio]
-            prices = [asset['current_price'] for asset in portfolio]
+            allocations = np.fromiter((asset['allocation_percentage'] for asset in portfolio),
+                                      dtype=np.float64, count=len(portfolio))
             
             # Choose color scheme based on sentiment
             colors = self.color_schemes.get(market_sentiment, self.color_schemes['neutral'])
@@ -583,7 +667,14 @@ class AIEnhancedVisualizations:
             
             # Prepare timeline data
             dates = [entry.get('timestamp', '') for entry in sentiment_data]
-            sentiments = [entry.get('sentiment_score', 0) for entry in sentiment_data]
+            sentiments = np.fromiter((entry.get('sentiment_score', 0) for entry in sentiment_data),
+                                     dtype=np.float64, count=len(sentiment_data))
+            
+            # Long histories are thinned out so the browser draws a bounded number of points
+            if len(sentiments) > MAX_TIMELINE_POINTS:
+                keep = _lttb_indices(sentiments, MAX_TIMELINE_POINTS)
+                dates = [dates[i] for i in keep]
+                sentiments = sentiments[keep]
             
             # Create timeline
             fig = go.Figure()
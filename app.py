@@ -6,43 +6,233 @@ Integrating CoinGecko MCP Server for superior crypto data access and AI-powered
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import numpy as np
-from web3 import Web3
 import json
-from datetime import datetime, timedelta
+from string import Template
 import os
+import hashlib
+import pickle
+import tempfile
 from dotenv import load_dotenv
-from web3_integration import EthereumPortfolioManager
-from wallet_manager import MultiWalletManager
-from mcp_integration import CoinGeckoMCPServer, MCPPortfolioOptimizer, check_mcp_server_status, get_mcp_enhanced_data
-from ai_features import ai_chat, ai_predictor, ai_visualizations
+from mcp_integration import mcp_optimizer, MarketSentiment
 import time
 import asyncio
-from typing import Dict, List, Optional, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from typing import Dict, List, Optional
 
 # Load environment variables
 load_dotenv()
 
-# Initialize session state for retry functionality and notifications
-if 'retry_default' not in st.session_state:
-    st.session_state.retry_default = False
-if 'retry_fewer' not in st.session_state:
-    st.session_state.retry_fewer = False
+# Initialize session state for notifications
 if 'rate_limit_notified' not in st.session_state:
     st.session_state.rate_limit_notified = False
 
-# Initialize MCP components
-mcp_server = CoinGeckoMCPServer()
-mcp_optimizer = MCPPortfolioOptimizer()
+# The MCP optimizer (and its server) are mcp_integration module singletons: built once per server process
+# on first import (one HTTP session, one guidelines fetch) and shared by every session, so
+# any state they hold, such as the rate limit cooldown, is global rather than per user
 
-# Initialize wallet manager
-wallet_manager = MultiWalletManager()
+# On-disk cache so market data and generated portfolios survive app restarts
+_DISK_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".app_cache")
 
-# Initialize Web3 with build artifacts support
-portfolio_manager = EthereumPortfolioManager()
+def _disk_cached(key: tuple, expire: int, compute, is_valid=bool):
+    """Return compute() memoized on disk under key for expire seconds (only results passing is_valid are stored)"""
+    path = os.path.join(_DISK_CACHE_DIR, hashlib.sha256(repr(key).encode()).hexdigest() + ".pkl")
+    try:
+        with open(path, 'rb') as f:
+            stored_at, value = pickle.load(f)
+        if time.time() - stored_at < expire:
+            return value
+    except Exception:
+        # Missing, truncated or otherwise unreadable entries are a cache miss
+        pass
+    
+    value = compute()
+    if is_valid(value):
+        tmp_path = None
+        try:
+            os.makedirs(_DISK_CACHE_DIR, exist_ok=True)
+            # A unique temp file per writer: script threads and sessions may store the same key at once
+            fd, tmp_path = tempfile.mkstemp(dir=_DISK_CACHE_DIR, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((time.time(), value), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return value
+
+def _has_market_data(bundle: Optional[Dict]) -> bool:
+    """Whether an enhanced market data bundle holds real market rows, not a failed fetch"""
+    return bool(bundle and bundle.get('market_data'))
+
+def _has_portfolio(result: Optional[Dict]) -> bool:
+    """Whether an optimizer result holds a generated portfolio"""
+    return bool(result and result.get('portfolio'))
+
+# Cheap cache keys for portfolio payloads: st.cache_data would otherwise pickle and MD5 every
+# argument; these hash a canonical byte form once with BLAKE2b instead
+def _fast_dict_hash(data: Dict) -> str:
+    """Digest of a (nested) dict, independent of key order"""
+    return hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+def _df_hash(df: pd.DataFrame) -> str:
+    """Digest of a DataFrame's values and index"""
+    return hashlib.blake2b(pd.util.hash_pandas_object(df, index=True).values.tobytes(), digest_size=16).hexdigest()
+
+PORTFOLIO_HASH_FUNCS = {dict: _fast_dict_hash, pd.DataFrame: _df_hash}
+
+# Cached CoinGecko fetches so reruns inside the TTL window reuse the last response
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def _cached_markets(per_page: int) -> List[Dict]:
+    """Coins market data from the MCP server, cached per page size"""
+    return mcp_optimizer.mcp_server.get_coins_markets_mcp(per_page=per_page)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_status() -> Optional[Dict]:
+    """MCP server ping status"""
+    return mcp_optimizer.mcp_server.get_server_status()
+
+def _probe_mcp(max_age: float = 60) -> bool:
+    """Check MCP server connectivity, reusing this session's last successful probe if recent"""
+    last_probe = st.session_state.get('_mcp_probe_ts', 0)
+    if time.monotonic() - last_probe < max_age and st.session_state.get('_mcp_probe_ok'):
+        return True
+    
+    status = _cached_status()
+    ok = bool(status and status.get('gecko_says'))
+    if not ok:
+        # Only successful pings stay cached, so the next probe really re-checks the server
+        _cached_status.clear()
+    st.session_state['_mcp_probe_ts'] = time.monotonic()
+    st.session_state['_mcp_probe_ok'] = ok
+    return ok
+
+_ENHANCED_MARKET_DATA_KEY = ('enhanced_market_data',)
+
+def _fetch_enhanced_market_data() -> Dict:
+    """Fetch all enhanced market endpoints concurrently"""
+    return asyncio.run(mcp_optimizer.get_enhanced_market_data_async())
+
+class _MarketDataRefresher:
+    """
+    Background thread that is the only place the enhanced market data is fetched. It refreshes
+    the bundle through the disk cache while sessions keep reading it, and stops after
+    IDLE_TIMEOUT seconds without a reader; the next read starts it again.
+    """
+    
+    MAX_AGE = 240
+    INTERVAL = 30
+    IDLE_TIMEOUT = 600
+    FIRST_FETCH_TIMEOUT = 20
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._latest: Optional[Dict] = None
+        self._error: Optional[str] = None
+        self._last_read = time.monotonic()
+    
+    def read(self) -> Dict:
+        """Latest bundle (with an 'error' message if the last fetch failed), waiting only if there is none yet"""
+        with self._lock:
+            self._last_read = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="market-data-refresh", daemon=True)
+                self._thread.start()
+        if self._latest is None:
+            self._ready.wait(self.FIRST_FETCH_TIMEOUT)
+        
+        bundle = self._latest or {}
+        error = self._error
+        return {**bundle, 'error': error} if error else bundle
+    
+    def _run(self):
+        """Refresh loop; exits once no session has read the data for IDLE_TIMEOUT seconds"""
+        while True:
+            try:
+                bundle = _disk_cached(_ENHANCED_MARKET_DATA_KEY, self.MAX_AGE,
+                                      _fetch_enhanced_market_data, _has_market_data)
+            except Exception:
+                bundle = None
+            
+            if _has_market_data(bundle):
+                self._latest, self._error = bundle, None
+            else:
+                # A failed fetch never replaces good data; st.* calls are dropped on this thread,
+                # so the failure reaches the page through the bundle's 'error' field instead
+                if self._latest is None:
+                    self._latest = bundle
+                self._error = ("⏱️ Rate limit exceeded. Showing the last market data until the limit resets."
+                               if mcp_optimizer.mcp_server.is_rate_limited()
+                               else "❌ Could not refresh market data from the MCP server.")
+            self._ready.set()
+            
+            time.sleep(self.INTERVAL)
+            with self._lock:
+                if time.monotonic() - self._last_read >= self.IDLE_TIMEOUT:
+                    self._ready.clear()
+                    self._thread = None
+                    return
+
+@st.cache_resource(show_spinner=False)
+def _market_data_refresher() -> _MarketDataRefresher:
+    """The per-process market data refresher"""
+    return _MarketDataRefresher()
+
+# Script runs get a copy of the refresher's latest bundle, re-read from it at most once a minute;
+# the caches derived from the bundle use the same window so they never outlive it
+_MARKET_DATA_TTL = 60
+
+@st.cache_data(ttl=_MARKET_DATA_TTL, show_spinner=False)
+def _cached_enhanced_market_data() -> Dict:
+    """Enhanced market data (markets, global, trending, DeFi and AI sentiment)"""
+    return _market_data_refresher().read()
+
+@st.cache_data(ttl=_MARKET_DATA_TTL, show_spinner=False)
+def _cached_sentiment() -> Optional[MarketSentiment]:
+    """Headline sentiment figures from the enhanced market data, if available"""
+    analysis = _cached_enhanced_market_data().get('ai_sentiment')
+    return MarketSentiment.from_analysis(analysis) if analysis else None
+
+def _cached_optimize(risk_profile: str, investment_amount: float, preferred_sectors: List[str],
+                     max_assets: int, market_data: Optional[List[Dict]] = None) -> Dict:
+    """AI-optimized portfolio, persisted on disk per (risk profile, sectors, amount, max assets)"""
+    # Sorted tuple rather than frozenset: its repr, and so the cache file name, is stable across processes
+    key = ('optimize', risk_profile, tuple(sorted(preferred_sectors)), investment_amount, max_assets)
+    return _disk_cached(key, 3600, lambda: mcp_optimizer.ai_optimize_portfolio(
+        risk_profile=risk_profile,
+        investment_amount=investment_amount,
+        preferred_sectors=preferred_sectors,
+        max_assets=max_assets,
+        market_data=market_data
+    ), _has_portfolio)
+
+# AI analytics depend only on the portfolio (and market mood), so tab switches reuse them
+@st.cache_data(ttl=600, hash_funcs=PORTFOLIO_HASH_FUNCS, max_entries=64, show_spinner=False)
+def _cached_recommendations(portfolio_data: Dict, market_mood: Optional[str]) -> List[str]:
+    """Smart recommendations for a portfolio under the given market mood"""
+    from ai_features import ai_chat
+    market_data = {'ai_sentiment': {'market_mood': market_mood}} if market_mood else {}
+    return ai_chat.get_smart_recommendations(portfolio_data, market_data)
+
+@st.cache_data(ttl=600, hash_funcs=PORTFOLIO_HASH_FUNCS, max_entries=64, show_spinner=False)
+def _cached_portfolio_analytics(portfolio_data: Dict):
+    """Predictions, risk metrics and insights for a portfolio"""
+    from ai_features import ai_predictor
+    analysis = ai_predictor.analyze(portfolio_data)
+    return analysis['predictions'], analysis['risk'], analysis['insights']
+
+def _market_mood(market_data: Dict) -> Optional[str]:
+    """Market mood from an enhanced market data bundle, if present"""
+    return (market_data.get('ai_sentiment') or {}).get('market_mood')
+
+@st.cache_data(hash_funcs=PORTFOLIO_HASH_FUNCS, max_entries=32, show_spinner=False)
+def _cached_ai_chart(portfolio_data: Dict, market_sentiment: str):
+    """AI-enhanced portfolio chart, rebuilt only when the portfolio or market mood changes"""
+    from ai_features import ai_visualizations
+    return ai_visualizations.create_ai_enhanced_portfolio_chart(portfolio_data, market_sentiment)
 
 # Enhanced Streamlit Web Application with AI Integration
 st.set_page_config(
@@ -52,287 +242,24 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Beautiful Black and White Theme with Gold Accents
-st.markdown("""
-<style>
-    /* Clean Black and White Theme with Gold Accents */
-    .stApp {
-        background: #ffffff;
-        color: #000000;
-    }
-
-    /* VISIBILITY FIX: Ensure subheaders and metric labels are black on white background */
-    h3, [data-testid="stMetricLabel"] {
-        color: #000000 !important;
-    }
-    
-    /* Custom Scrollbar */
-    ::-webkit-scrollbar {
-        width: 8px;
-    }
-    
-    ::-webkit-scrollbar-track {
-        background: #f5f5f5;
-    }
-    
-    ::-webkit-scrollbar-thumb {
-        background: #D4AF37;
-        border-radius: 4px;
-    }
-    
-    ::-webkit-scrollbar-thumb:hover {
-        background: #B8860B;
-    }
-    
-    /* Main Header - Elegant Black and Gold */
-    .main-header {
-        background: #000000;
-        border: 2px solid #D4AF37;
-        border-radius: 20px;
-        padding: 2.5rem;
-        color: #ffffff;
-        text-align: center;
-        margin-bottom: 2rem;
-        box-shadow: 0 20px 40px rgba(212, 175, 55, 0.2);
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .main-header::before {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        bottom: 0;
-        background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><defs><pattern id="grid" width="10" height="10" patternUnits="userSpaceOnUse"><path d="M 10 0 L 0 0 0 10" fill="none" stroke="rgba(212,175,55,0.3)" stroke-width="0.5"/></pattern></defs><rect width="100" height="100" fill="url(%23grid)"/></svg>');
-        opacity: 0.3;
-    }
-    
-    .main-header::after {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        height: 2px;
-        background: linear-gradient(90deg, transparent, #D4AF37, transparent);
-        animation: shimmer 3s infinite;
-    }
-    
-    @keyframes shimmer {
-        0% { transform: translateX(-100%); }
-        100% { transform: translateX(100%); }
-    }
-    
-    /* Card Styles for Tokens, Protocols, Recommendations, etc. */
-    .token-card, .protocol-card, .ai-feature, .recommendation-card, .trending-coin-card, .prediction-card {
-        background: #000000;
-        border: 1px solid #D4AF37;
-        border-radius: 16px;
-        padding: 1.5rem;
-        margin: 0.5rem 0;
-        color: #ffffff;
-        box-shadow: 0 8px 16px rgba(0, 0, 0, 0.1);
-        transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
-    }
-
-    .token-card:hover, .protocol-card:hover, .ai-feature:hover, .recommendation-card:hover, .trending-coin-card:hover, .prediction-card:hover {
-        transform: translateY(-4px) scale(1.02);
-        box-shadow: 0 20px 40px rgba(212, 175, 55, 0.3);
-        border-color: #FFD700;
-        background: #111111;
-    }
-
-    .token-card {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-    }
-    
-    /* AI Badge - Gold */
-    .ai-badge {
-        background: linear-gradient(135deg, #D4AF37 0%, #FFD700 100%);
-        color: #000000;
-        padding: 0.5rem 1rem;
-        border-radius: 20px;
-        font-size: 0.8rem;
-        font-weight: bold;
-        display: inline-block;
-        margin: 0.5rem;
-        box-shadow: 0 4px 12px rgba(212, 175, 55, 0.3);
-        animation: pulse 2s infinite;
-    }
-    
-    @keyframes pulse {
-        0%, 100% { transform: scale(1); }
-        50% { transform: scale(1.05); }
-    }
-    
-    /* Chat Container - Black with Gold Border */
-    .chat-container {
-        background: #000000;
-        border: 1px solid #D4AF37;
-        border-radius: 16px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
-        color: #ffffff;
-        box-shadow: 0 8px 16px rgba(0, 0, 0, 0.1);
-    }
-    
-    .chat-container:hover {
-        border-color: #FFD700;
-        box-shadow: 0 20px 40px rgba(212, 175, 55, 0.3);
-        background: #111111;
-    }
-    
-    /* Financial Metrics Cards - Khaki with Black Border */
-    .metric-card {
-        background: #f0e68c;
-        border: 2px solid #000000;
-        border-radius: 16px;
-        padding: 1.5rem;
-        margin: 0.5rem;
-        text-align: center;
-        transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
-        position: relative;
-        color: #000000;
-        box-shadow: 0 8px 16px rgba(0, 0, 0, 0.1);
-    }
-    
-    .metric-card:hover {
-        transform: translateY(-4px) scale(1.02);
-        box-shadow: 0 20px 40px rgba(212, 175, 55, 0.3);
-        border-color: #D4AF37;
-        background: #f5e6a0;
-    }
-    
-    /* Floating Elements Animation */
-    .floating-element {
-        animation: float 3s ease-in-out infinite;
-    }
-    
-    @keyframes float {
-        0%, 100% { transform: translateY(0px); }
-        50% { transform: translateY(-10px); }
-    }
-    
-    /* Sidebar Styling - White Background */
-    .css-1d391kg {
-        background: #ffffff;
-        border-right: 2px solid #D4AF37;
-    }
-    
-    /* Tab Styling - Black and Gold */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-        background: #000000;
-        border-radius: 8px;
-        padding: 4px;
-        border: 1px solid #D4AF37;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        background: #000000;
-        border-radius: 6px;
-        color: #ffffff;
-        border: 1px solid #D4AF37;
-        transition: all 0.3s ease;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background: #D4AF37;
-        color: #000000;
-        border-color: #FFD700;
-    }
-    
-    /* Input Styling - Khaki Background with Black Border */
-    .stTextInput > div > div > input, .stSelectbox > div > div {
-        background: #f0e68c;
-        border: 2px solid #000000;
-        border-radius: 8px;
-        color: #000000;
-    }
-    
-    .stTextInput > div > div > input:focus {
-        border-color: #D4AF37;
-        box-shadow: 0 0 0 2px rgba(212, 175, 55, 0.2);
-    }
-    
-    /* Placeholder text styling */
-    .stTextInput > div > div > input::placeholder {
-        color: #000000 !important;
-    }
-    
-    /* Slider Styling - Gold */
-    .stSlider > div > div > div > div {
-        background: #D4AF37;
-    }
-    
-    .stSlider > div > div > div > div > div {
-        background: #FFD700;
-    }
-    
-    /* Success/Info/Error/Warning Messages */
-    .stSuccess, .stInfo, .stError, .stWarning {
-        background: #f0e68c;
-        border: 2px solid #000000;
-        color: #000000;
-        border-radius: 8px;
-    }
-    .stError, .stWarning {
-        border-color: #ff4444;
-    }
-    
-    /* Chart Container - Khaki Background */
-    .js-plotly-plot {
-        background: #f0e68c;
-        border-radius: 8px;
-        padding: 1rem;
-        border: 2px solid #000000;
-    }
-    
-    /* Button Styling */
-    .stButton > button {
-        border-radius: 8px;
-        padding: 0.75rem 1.5rem;
-        font-weight: 600;
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-    }
-    .stButton > button[data-testid="baseButton-primary"] {
-        background: linear-gradient(135deg, #D4AF37 0%, #FFD700 100%);
-        color: #000000;
-        border: none;
-        box-shadow: 0 4px 12px rgba(212, 175, 55, 0.3);
-    }
-    .stButton > button[data-testid="baseButton-primary"]:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 8px 24px rgba(212, 175, 55, 0.4);
-    }
-    .stButton > button[data-testid="baseButton-secondary"] {
-        background: #000000;
-        color: #ffffff;
-        border: 2px solid #D4AF37;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
-    }
-    .stButton > button[data-testid="baseButton-secondary"]:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(212, 175, 55, 0.3);
-        border-color: #FFD700;
-        background: #111111;
-    }
-    
-    /* Ensure all text in main content area is black by default */
-    .main .block-container {
-        color: #000000;
-    }
-    
-</style>
-""", unsafe_allow_html=True)
+# Beautiful Black and White Theme with Gold Accents, kept as a static stylesheet next to the app
+_THEME_CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "theme.css")
+
+@st.cache_data
+def _style_html() -> str:
+    """Theme <style> block, read from disk and assembled once for the lifetime of the app"""
+    with open(_THEME_CSS_PATH, encoding="utf-8") as f:
+        return f"<style>{f.read()}</style>"
+
+# Streamlit 1.28 has no st.html, and any element skipped on a rerun is removed
+# from the page, so the stylesheet is emitted on every run as a bare <style> block
+st.markdown(_style_html(), unsafe_allow_html=True)
 
 # Main Header with Floating Elements
-st.markdown("""
+@st.cache_data
+def _header_html() -> str:
+    """Static main header markup, built once for the lifetime of the app"""
+    return """
 <div class="main-header gold-shimmer">
     <h1 style="color: #ffffff;">🚀 Decentralized Portfolio Optimizer</h1>
     <p style="color: #ffffff;">AI-Powered Crypto Portfolio Management with Blockchain Integration</p>
@@ -342,31 +269,128 @@ st.markdown("""
         <span class="ai-badge floating-element" style="animation-delay: 1s;">📊 Real-time Data</span>
     </div>
 </div>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(_header_html(), unsafe_allow_html=True)
+
+# Schema of the portfolio token table
+PORTFOLIO_TABLE_COLUMNS = ('symbol', 'name', 'allocation_usd', 'allocation_percentage')
+PORTFOLIO_TABLE_DTYPES = {
+    'symbol': 'category',
+    'name': 'string',
+    'allocation_usd': 'float64',
+    'allocation_percentage': 'float32'
+}
+
+# Card templates for the per-item HTML blocks, parsed once at import
+_CHAT_TPL = Template("""
+        <div class="chat-container">
+            <strong>AI Assistant:</strong><br>
+            $response
+        </div>
+        """)
+
+_TRENDING_COIN_TPL = Template("""
+                        <div class="trending-coin-card">
+                            <div style="display: flex; justify-content: space-between; align-items: center;">
+                                <div>
+                                    <h4 style="margin: 0; color: #D4AF37;">$name ($symbol)</h4>
+                                    <p style="margin: 0; color: #ffffff; font-size: 0.9rem;">Rank: #$rank</p>
+                                </div>
+                                <div style="text-align: right;">
+                                    <p style="margin: 0; color: #D4AF37; font-size: 1.1rem;">$price_btc BTC</p>
+                                </div>
+                            </div>
+                        </div>
+                        """)
+
+@st.cache_data(ttl=_MARKET_DATA_TTL, show_spinner=False)
+def _trending_cards_html() -> str:
+    """Markup for the top 6 trending coin cards, built once per market data refresh"""
+    trending = _cached_enhanced_market_data().get('trending_data') or {}
+    return "".join(
+        _TRENDING_COIN_TPL.substitute(
+            name=coin['item']['name'],
+            symbol=coin['item']['symbol'].upper(),
+            rank=coin['item'].get('market_cap_rank', 'N/A'),
+            price_btc=f"{coin['item'].get('price_btc', 0):.8f}"
+        )
+        for coin in (trending.get('coins') or [])[:6]
+    )
+
+_RECOMMENDATION_TPL = Template("""
+                <div class="recommendation-card">
+                    <p style="margin: 0; color: #ffffff;">💡 $recommendation</p>
+                </div>
+                """)
+
+_INSIGHT_TPL = Template("""
+                <div class="ai-feature">
+                    <h4>💡 $title</h4>
+                    <p>$description</p>
+                </div>
+                """)
+
+# Static notices, cards and footer, built once at import
+_NOTICE_TPL = Template("""
+        <div style="background: #f0e68c; border: 2px solid #000000; border-radius: 8px; padding: 1rem; color: #000000;">
+            $message
+        </div>
+        """)
+
+_NO_PORTFOLIO_HTML = _NOTICE_TPL.substitute(
+    message="⚠️ No portfolio data available. Click 'Generate AI-Optimized Portfolio' to create one."
+)
+_GENERATE_FIRST_HTML = _NOTICE_TPL.substitute(message="Generate a portfolio first to see predictive analytics")
+
+_PROTOCOL_CARDS_HTML = """
+                <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 1rem;">
+                    <div class="protocol-card floating-element">
+                        <h4>🏦 DeFi Protocols</h4>
+                        <p style="color: #D4AF37; font-size: 1.2rem;">$12,450.00</p>
+                        <p style="color: #FFD700;">+8.2% (24h)</p>
+                    </div>
+                    <div class="protocol-card floating-element">
+                        <h4>⛓️ Multichain Assets</h4>
+                        <p style="color: #D4AF37; font-size: 1.2rem;">$8,750.00</p>
+                        <p style="color: #FFD700;">+5.1% (24h)</p>
+                    </div>
+                </div>
+                """
+
+_FOOTER_HTML = """
+<div style="text-align: center; color: #000000; padding: 2rem; background: #f0e68c; border: 2px solid #000000; border-radius: 16px; margin: 2rem 0;">
+    <p style="color: #000000; font-weight: bold;">🚀 Powered by AI, Coingecko MCP & Blockchain Technology</p>
+    <p style="color: #000000;">Built with Streamlit, CoinGecko API, and Ethereum Smart Contracts by Rancho</p>
+    <p>
+        <a href="https://x.com/Rancho_GHA" target="_blank" style="text-decoration: none; color: #D4AF37;">
+            <span style="font-size: 24px;">𝕏</span> Follow @Rancho_GHA
+        </a>
+    </p>
+</div>
+"""
 
-# SEARCH Section
+# Sidebar: search, quick actions, configuration and diagnostics
 with st.sidebar:
+    # SEARCH Section
     st.header("🔍 SEARCH")
     
     # Search interface
     user_query = st.text_input("Ask me about portfolio optimization:", placeholder="How can I optimize my portfolio?")
     
     if user_query:
+        from ai_features import ai_chat
         ai_response = ai_chat.process_user_query(user_query)
-        st.markdown(f"""
-        <div class="chat-container">
-            <strong>AI Assistant:</strong><br>
-            {ai_response}
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_CHAT_TPL.substitute(response=ai_response), unsafe_allow_html=True)
     
     # Quick AI actions with metallic button styling
     st.header("🚀 Quick AI Actions")
     if st.button("💡 Get Smart Recommendations", key="smart_rec_btn"):
-        if 'portfolio_data' in st.session_state:
-            recommendations = ai_chat.get_smart_recommendations(
-                st.session_state.portfolio_data,
-                st.session_state.get('market_data', {})
+        portfolio_data = st.session_state.get('portfolio_data')
+        if portfolio_data is not None:
+            recommendations = _cached_recommendations(
+                portfolio_data,
+                _market_mood(st.session_state.get('market_data', {}))
             )
             st.write("**AI Recommendations:**")
             for rec in recommendations:
@@ -376,142 +400,152 @@ with st.sidebar:
     
     if st.button("📊 Market Sentiment Analysis", key="sentiment_btn"):
         try:
-            market_data = mcp_optimizer.get_enhanced_market_data()
-            if market_data.get('ai_sentiment'):
-                sentiment = market_data['ai_sentiment']
-                st.success(f"Market Mood: {sentiment.get('market_mood', 'Unknown')}")
-                st.info(f"Sentiment Score: {sentiment.get('sentiment_score', 0):.2f}")
+            sentiment = _cached_sentiment()
+            if sentiment:
+                st.success(f"Market Mood: {sentiment.mood}")
+                st.info(f"Sentiment Score: {sentiment.score:.2f}")
         except Exception as e:
             st.error("Error analyzing sentiment")
-
-# Sidebar Configuration
-with st.sidebar:
-    st.header("⚙️ Configuration")
     
-    # Risk Profile Selection
-    risk_profile = st.selectbox(
-        "🎯 Risk Profile",
-        ["low", "medium", "high"],
-        index=1,
-        help="Select your investment risk tolerance"
-    )
-    
-    # Investment Amount
-    investment_amount = st.number_input(
-        "💰 Investment Amount (USD)",
-        min_value=100.0,
-        max_value=1000000.0,
-        value=10000.0,
-        step=100.0,
-        help="Enter your total investment amount"
-    )
-    
-    # Sector Selection
-    available_sectors = ["DeFi", "Layer 1", "Layer 2", "Gaming", "NFT", "AI/ML", "Privacy", "Infrastructure"]
-    selected_sectors = st.multiselect(
-        "🏢 Preferred Sectors",
-        available_sectors,
-        default=["DeFi", "Layer 1"],
-        help="Select your preferred cryptocurrency sectors"
-    )
-    
-    # Maximum Assets
-    max_assets = st.slider(
-        "📊 Maximum Assets",
-        min_value=3,
-        max_value=20,
-        value=10,
-        help="Maximum number of assets in your portfolio"
-    )
-    
-    # Handle retry states
-    if st.session_state.retry_default:
-        max_assets = 5
-        selected_sectors = ["DeFi", "Layer 1"]
-        st.session_state.retry_default = False
+    # Sidebar Configuration
+    st.header("⚙️ Configuration")
     
-    if st.session_state.retry_fewer:
-        max_assets = 3
-        st.session_state.retry_fewer = False
+    # Widgets inside a form only rerun the script when the settings are applied, so
+    # adjusting several of them costs one rerun instead of one per change
+    with st.form("config_form"):
+        # Risk Profile Selection
+        risk_profile = st.selectbox(
+            "🎯 Risk Profile",
+            ["low", "medium", "high"],
+            index=1,
+            help="Select your investment risk tolerance"
+        )
+        
+        # Investment Amount
+        investment_amount = st.number_input(
+            "💰 Investment Amount (USD)",
+            min_value=100.0,
+            max_value=1000000.0,
+            value=10000.0,
+            step=100.0,
+            help="Enter your total investment amount"
+        )
+        
+        # Sector Selection
+        available_sectors = ["DeFi", "Layer 1", "Layer 2", "Gaming", "NFT", "AI/ML", "Privacy", "Infrastructure"]
+        selected_sectors = st.multiselect(
+            "🏢 Preferred Sectors",
+            available_sectors,
+            default=["DeFi", "Layer 1"],
+            help="Select your preferred cryptocurrency sectors"
+        )
+        
+        # Maximum Assets
+        max_assets = st.slider(
+            "📊 Maximum Assets",
+            min_value=3,
+            max_value=20,
+            value=10,
+            help="Maximum number of assets in your portfolio"
+        )
+        
+        st.form_submit_button("✅ Apply Configuration", use_container_width=True)
     
     # Diagnostic Section
     st.header("🔧 Diagnostics")
     if st.button("🔍 Run Connection Test"):
         with st.spinner("Testing connections..."):
-            try:
-                status = mcp_optimizer.mcp_server.get_server_status()
-                if status and status.get('gecko_says'):
-                    st.success("✅ Connection successful")
-                else:
-                    st.error("❌ Connection failed")
-            except Exception as e:
-                st.error(f"❌ Connection failed: {e}")
+            # probe name -> (call, success check, ok message, failure message, error prefix)
+            probes = {
+                'connection': (_probe_mcp, bool,
+                               "✅ Connection successful", "❌ Connection failed", "❌ Connection failed"),
+                'data': (lambda: _cached_markets(per_page=5), bool,
+                         "✅ Data available", "❌ No data available", "❌ Data error")
+            }
+            # Placeholders keep the result order stable whichever probe finishes first
+            slots = {name: st.empty() for name in probes}
             
-            try:
-                market_data = mcp_optimizer.mcp_server.get_coins_markets_mcp(per_page=5)
-                if market_data:
-                    st.success("✅ Data available")
-                else:
-                    st.error("❌ No data available")
-            except Exception as e:
-                st.error(f"❌ Data error: {e}")
+            # Run the blocking probes side by side on threads bound to this script run
+            with ThreadPoolExecutor(max_workers=4, initializer=add_script_run_ctx,
+                                    initargs=(None, get_script_run_ctx())) as executor:
+                futures = {executor.submit(probe[0]): name for name, probe in probes.items()}
+                for future in as_completed(futures):
+                    name = futures[future]
+                    _, is_ok, ok_message, failure_message, error_prefix = probes[name]
+                    try:
+                        if is_ok(future.result()):
+                            slots[name].success(ok_message)
+                        else:
+                            slots[name].error(failure_message)
+                    except Exception as e:
+                        slots[name].error(f"{error_prefix}: {e}")
+
+def _run_optimize(risk_profile: str, investment_amount: float, preferred_sectors: List[str],
+                  max_assets: int) -> Optional[Dict]:
+    """Generate a portfolio for the given settings, store it in session state and return it"""
+    with st.spinner("🔄 Generating portfolio with AI-enhanced data..."):
+        try:
+            # Fetch all market endpoints concurrently, then optimize on the same snapshot
+            market_data = _cached_enhanced_market_data()
+            
+            # Get AI-enhanced portfolio data
+            portfolio_data = _cached_optimize(
+                risk_profile=risk_profile,
+                investment_amount=investment_amount,
+                preferred_sectors=preferred_sectors,
+                max_assets=max_assets,
+                market_data=market_data.get('market_data')
+            )
+            
+            if portfolio_data and portfolio_data.get('portfolio'):
+                st.session_state.portfolio_data = portfolio_data
+                st.session_state.market_data = market_data
+                return portfolio_data
+            else:
+                st.error("❌ Failed to generate portfolio. Please try again.")
+                return None
+                
+        except Exception as e:
+            st.error("❌ Error generating portfolio")
+            st.stop()
 
 # Main application tabs
-tab1, tab2, tab3, tab4 = st.tabs([
+# st.tabs runs every tab body on each rerun, so sections are picked with a radio
+# and only the selected one executes
+SECTIONS = [
     "🎯 Portfolio Generation",
     "📊 Market Analytics", 
     "🤖 AI Insights",
     "📈 Predictive Analytics"
-])
+]
+active_tab = st.radio("Section", SECTIONS, key="active_tab", horizontal=True, label_visibility="collapsed")
 
-with tab1:
+if active_tab == SECTIONS[0]:
     # Portfolio Generation Section
     st.subheader("🎯 Portfolio Generation")
     
     # Generate portfolio using AI-enhanced data with metallic styling
     if st.button("🚀 Generate AI-Optimized Portfolio", type="primary", key="generate_portfolio_btn"):
-        with st.spinner("🔄 Generating portfolio with AI-enhanced data..."):
-            try:
-                # Get AI-enhanced portfolio data
-                portfolio_data = mcp_optimizer.ai_optimize_portfolio(
-                    risk_profile=risk_profile,
-                    investment_amount=investment_amount,
-                    preferred_sectors=selected_sectors,
-                    max_assets=max_assets
-                )
-                
-                if portfolio_data and portfolio_data.get('portfolio'):
-                    st.session_state.portfolio_data = portfolio_data
-                    st.session_state.market_data = mcp_optimizer.get_enhanced_market_data()
-                else:
-                    st.error("❌ Failed to generate portfolio. Please try again.")
-                    
-            except Exception as e:
-                st.error("❌ Error generating portfolio")
-                st.stop()
+        _run_optimize(risk_profile, investment_amount, selected_sectors, max_assets)
+    
+    # Read session state once for the rest of the section
+    portfolio_data = st.session_state.get('portfolio_data')
     
     # Retry button if portfolio generation failed
-    if 'portfolio_data' not in st.session_state or not st.session_state.portfolio_data:
-        st.markdown("""
-        <div style="background: #f0e68c; border: 2px solid #000000; border-radius: 8px; padding: 1rem; color: #000000;">
-            ⚠️ No portfolio data available. Click 'Generate AI-Optimized Portfolio' to create one.
-        </div>
-        """, unsafe_allow_html=True)
+    if not portfolio_data:
+        st.markdown(_NO_PORTFOLIO_HTML, unsafe_allow_html=True)
         
         # Quick retry with different settings
         col1, col2 = st.columns(2)
         with col1:
             if st.button("🔄 Retry with Default Settings", type="secondary", key="retry_default_btn"):
-                st.session_state.retry_default = True
-                st.rerun()
+                portfolio_data = _run_optimize(risk_profile, investment_amount, ["DeFi", "Layer 1"], 5)
         
         with col2:
             if st.button("🔧 Try with Fewer Assets", type="secondary", key="retry_fewer_btn"):
-                st.session_state.retry_fewer = True
-                st.rerun()
+                portfolio_data = _run_optimize(risk_profile, investment_amount, selected_sectors, 3)
     
-    if 'portfolio_data' in st.session_state and st.session_state.portfolio_data:
-        portfolio_data = st.session_state.portfolio_data
+    if portfolio_data:
         st.subheader("📊 Portfolio Summary")
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -525,83 +559,62 @@ with tab1:
         
         st.subheader("📈 AI-Enhanced Portfolio Visualizations")
         if portfolio_data.get('portfolio'):
-            portfolio_df = pd.DataFrame(portfolio_data['portfolio'])
+            # Only the columns the token table shows, with a fixed schema instead of per-column inference
+            # (USD amounts stay float64 for cent accuracy)
+            portfolio_df = pd.DataFrame.from_records(
+                portfolio_data['portfolio'], columns=PORTFOLIO_TABLE_COLUMNS
+            ).astype(PORTFOLIO_TABLE_DTYPES, copy=False)
             try:
-                market_sentiment = st.session_state.get('market_data', {}).get('ai_sentiment', {}).get('market_mood', 'neutral')
-                ai_chart = ai_visualizations.create_ai_enhanced_portfolio_chart(portfolio_data, market_sentiment)
-                st.plotly_chart(ai_chart, use_container_width=True)
+                market_sentiment = _market_mood(st.session_state.get('market_data', {})) or 'neutral'
+                st.plotly_chart(_cached_ai_chart(portfolio_data, market_sentiment), use_container_width=True)
             except Exception as e:
                 st.error(f"❌ Error creating portfolio chart: {e}")
             
             st.subheader("🪙 Portfolio Tokens")
-            for asset in portfolio_data['portfolio'][:5]:
-                st.markdown(f"""
-                <div class="token-card floating-element">
-                    <div>
-                        <h4 style="margin: 0; color: #D4AF37;">{asset['symbol']}</h4>
-                        <p style="margin: 0; color: #ffffff;">{asset['name']}</p>
-                    </div>
-                    <div style="text-align: right;">
-                        <p style="margin: 0; color: #D4AF37; font-size: 1.2rem;">${asset['allocation_usd']:,.2f}</p>
-                        <p style="margin: 0; color: #ffffff;">{asset['allocation_percentage']:.1f}%</p>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+            st.dataframe(
+                portfolio_df,
+                column_config={
+                    'symbol': "Symbol",
+                    'name': "Name",
+                    'allocation_usd': st.column_config.NumberColumn("Allocation", format="$%.2f"),
+                    'allocation_percentage': st.column_config.ProgressColumn(
+                        "Weight", min_value=0, max_value=100, format="%.1f%%"
+                    )
+                },
+                hide_index=True,
+                use_container_width=True
+            )
             
             st.subheader("🔍 Protocol Insights")
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown("""
-                <div class="protocol-card floating-element">
-                    <h4>🏦 DeFi Protocols</h4>
-                    <p style="color: #D4AF37; font-size: 1.2rem;">$12,450.00</p>
-                    <p style="color: #FFD700;">+8.2% (24h)</p>
-                </div>
-                """, unsafe_allow_html=True)
-            with col2:
-                st.markdown("""
-                <div class="protocol-card floating-element">
-                    <h4>⛓️ Multichain Assets</h4>
-                    <p style="color: #D4AF37; font-size: 1.2rem;">$8,750.00</p>
-                    <p style="color: #FFD700;">+5.1% (24h)</p>
-                </div>
-                """, unsafe_allow_html=True)        
+            with st.container():
+                st.markdown(_PROTOCOL_CARDS_HTML, unsafe_allow_html=True)
         
 
-with tab2:
+if active_tab == SECTIONS[1]:
     st.subheader("📊 AI-Enhanced Market Analytics")
     try:
-        market_data = mcp_optimizer.get_enhanced_market_data()
+        market_data = _cached_enhanced_market_data()
+        if market_data.get('error'):
+            st.warning(market_data['error'])
         if market_data:
-            if market_data.get('ai_sentiment'):
-                sentiment = market_data['ai_sentiment']
-                col1, col2, col3 = st.columns(3)
+            sentiment = _cached_sentiment()
+            if sentiment:
+                col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    st.metric("Market Mood", sentiment.get('market_mood', 'Unknown'))
+                    st.metric("Market Mood", sentiment.mood)
                 with col2:
-                    st.metric("Sentiment Score", f"{sentiment.get('sentiment_score', 0):.2f}")
+                    st.metric("Sentiment Score", f"{sentiment.score:.2f}")
                 with col3:
-                    st.metric("Positive Coins", sentiment.get('positive_coins', 0))
+                    st.metric("Positive Coins", sentiment.positive)
+                with col4:
+                    st.metric("Negative Coins", sentiment.negative)
             
             if market_data.get('trending_data'):
                 st.subheader("🔥 Trending Coins")
-                trending = market_data['trending_data']
-                if trending.get('coins'):
-                    for coin in trending['coins'][:6]:
-                        coin_data = coin['item']
-                        st.markdown(f"""
-                        <div class="trending-coin-card">
-                            <div style="display: flex; justify-content: space-between; align-items: center;">
-                                <div>
-                                    <h4 style="margin: 0; color: #D4AF37;">{coin_data['name']} ({coin_data['symbol'].upper()})</h4>
-                                    <p style="margin: 0; color: #ffffff; font-size: 0.9rem;">Rank: #{coin_data.get('market_cap_rank', 'N/A')}</p>
-                                </div>
-                                <div style="text-align: right;">
-                                    <p style="margin: 0; color: #D4AF37; font-size: 1.1rem;">{coin_data.get('price_btc', 0):.8f} BTC</p>
-                                </div>
-                            </div>
-                        </div>
-                        """, unsafe_allow_html=True)
+                trending_cards = _trending_cards_html()
+                if trending_cards:
+                    # All cards in one markdown element
+                    st.markdown(trending_cards, unsafe_allow_html=True)
     except Exception as e:
         if "rate limit" in str(e).lower() and not st.session_state.get('rate_limit_notified', False):
             st.warning("⏱️ Rate limit exceeded. Please wait before making more requests.")
@@ -609,49 +622,46 @@ with tab2:
         elif "rate limit" not in str(e).lower():
             st.error(f"❌ Error loading market analytics: {e}")
 
-with tab3:
+if active_tab == SECTIONS[2]:
     st.subheader("🤖 AI Insights")
-    if 'portfolio_data' in st.session_state and 'market_data' in st.session_state:
-        portfolio_data = st.session_state.portfolio_data
-        market_data = st.session_state.market_data
-        recommendations = ai_chat.get_smart_recommendations(portfolio_data, market_data)
+    portfolio_data = st.session_state.get('portfolio_data')
+    market_data = st.session_state.get('market_data')
+    if portfolio_data is not None and market_data is not None:
+        recommendations = _cached_recommendations(portfolio_data, _market_mood(market_data))
         
         st.subheader("💡 AI Smart Recommendations")
         if recommendations:
-            for rec in recommendations:
-                st.markdown(f"""
-                <div class="recommendation-card">
-                    <p style="margin: 0; color: #ffffff;">💡 {rec}</p>
-                </div>
-                """, unsafe_allow_html=True)
+            st.markdown("".join(_RECOMMENDATION_TPL.substitute(recommendation=rec) for rec in recommendations),
+                        unsafe_allow_html=True)
         else:
             st.info("No recommendations available")
     else:
-        st.markdown("""
-        <div style="background: #f0e68c; border: 2px solid #000000; border-radius: 8px; padding: 1rem; color: #000000;">
-            Generate a portfolio first to see predictive analytics
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_GENERATE_FIRST_HTML, unsafe_allow_html=True)
 
-with tab4:
+if active_tab == SECTIONS[3]:
     st.subheader("📈 Predictive Analytics")
-    if 'portfolio_data' in st.session_state:
-        portfolio_data = st.session_state.portfolio_data
+    portfolio_data = st.session_state.get('portfolio_data')
+    if portfolio_data is not None:
+        predictions, risk_metrics, insights = _cached_portfolio_analytics(portfolio_data)
         
         st.subheader("🔮 AI Market Predictions")
-        predictions = ai_predictor.get_portfolio_predictions(portfolio_data)
         if predictions:
-            for prediction in predictions:
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Asset", prediction['asset'])
-                with col2:
-                    st.metric("Predicted Price", f"${prediction['predicted_price']:,.2f}")
-                with col3:
-                    st.metric("Confidence", f"{prediction['confidence']}%")
+            # One table element for all assets instead of a row of metrics per asset
+            st.dataframe(
+                pd.DataFrame(predictions, columns=['asset', 'predicted_price', 'confidence', 'trend']),
+                column_config={
+                    'asset': "Asset",
+                    'predicted_price': st.column_config.NumberColumn("Predicted Price", format="$%.2f"),
+                    'confidence': st.column_config.ProgressColumn(
+                        "Confidence", min_value=0, max_value=100, format="%d%%"
+                    ),
+                    'trend': "Trend"
+                },
+                hide_index=True,
+                use_container_width=True
+            )
         
         st.subheader("⚖️ Risk Analysis")
-        risk_metrics = ai_predictor.calculate_risk_metrics(portfolio_data)
         col1, col2, col3 = st.columns(3)
         with col1:
             st.metric("Average Volatility", f"{risk_metrics.get('avg_volatility', 0):.3f}")
@@ -661,34 +671,16 @@ with tab4:
             st.metric("Largest Position", f"{risk_metrics.get('largest_position', 0):.1f}%")
         
         st.subheader("ℹ️ Portfolio Insights")
-        insights = ai_predictor.get_portfolio_insights(portfolio_data)
         if insights:
-            for insight in insights:
-                st.markdown(f"""
-                <div class="ai-feature">
-                    <h4>💡 {insight['title']}</h4>
-                    <p>{insight['description']}</p>
-                </div>
-                """, unsafe_allow_html=True)
+            st.markdown("".join(
+                _INSIGHT_TPL.substitute(title=insight['title'], description=insight['description'])
+                for insight in insights
+            ), unsafe_allow_html=True)
         else:
             st.info("No detailed insights available for this portfolio.")
     else:
-        st.markdown("""
-        <div style="background: #f0e68c; border: 2px solid #000000; border-radius: 8px; padding: 1rem; color: #000000;">
-            Generate a portfolio first to see predictive analytics
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_GENERATE_FIRST_HTML, unsafe_allow_html=True)
 
 # Footer
 st.markdown("---")
-st.markdown("""
-<div style="text-align: center; color: #000000; padding: 2rem; background: #f0e68c; border: 2px solid #000000; border-radius: 16px; margin: 2rem 0;">
-    <p style="color: #000000; font-weight: bold;">🚀 Powered by AI, Coingecko MCP & Blockchain Technology</p>
-    <p style="color: #000000;">Built with Streamlit, CoinGecko API, and Ethereum Smart Contracts by Rancho</p>
-    <p>
-        <a href="https://x.com/Rancho_GHA" target="_blank" style="text-decoration: none; color: #D4AF37;">
-            <span style="font-size: 24px;">𝕏</span> Follow @Rancho_GHA
-        </a>
-    </p>
-</div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+st.markdown(_FOOTER_HTML, unsafe_allow_html=True)
\ No newline at end of file
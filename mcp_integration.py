@@ -7,10 +7,14 @@ Incorporates CoinGecko AI features and llms.txt guidelines for responsible AI be
 
 import requests
 import json
+import copy
 import asyncio
 import aiohttp
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, NamedTuple, Optional, Any
 import os
+import time
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
 import streamlit as st
 from datetime import datetime
@@ -22,6 +26,10 @@ warnings.filterwarnings('ignore')
 # Load environment variables
 load_dotenv()
 
+# CoinGecko API keys, read from the environment once at import
+COINGECKO_DEMO_API_KEY = os.getenv("COINGECKO_DEMO_API_KEY")
+COINGECKO_PRO_API_KEY = os.getenv("COINGECKO_PRO_API_KEY")
+
 def safe_gt(a, b):
     try:
         if a is None or b is None:
@@ -30,6 +38,46 @@ def safe_gt(a, b):
     except (ValueError, TypeError):
         return False
 
+# Risk-adjusted weights for the (market cap, volume, price change) AI score factors
+RISK_SCORE_WEIGHTS = {
+    "low": np.array([0.6, 0.3, 0.1]),
+    "medium": np.array([0.4, 0.3, 0.3]),
+    "high": np.array([0.2, 0.3, 0.5])
+}
+
+def compute_ai_scores(market_caps: np.ndarray, volumes: np.ndarray,
+                      price_changes: np.ndarray, risk_profile: str) -> np.ndarray:
+    """Score every coin in one vectorized pass over the market arrays"""
+    factors = np.column_stack((
+        np.minimum(market_caps / 1e9, 1),  # Normalize to 1B market cap
+        np.minimum(volumes / 1e8, 1),  # Normalize to 100M volume
+        np.abs(price_changes) / 100  # Normalize price change
+    ))
+    return factors @ RISK_SCORE_WEIGHTS.get(risk_profile, RISK_SCORE_WEIGHTS["high"])
+
+def compute_allocations(weights: np.ndarray, investment_amount: float):
+    """Split an investment in proportion to non-negative weights (USD amounts, percentages)"""
+    total = weights.sum()
+    fractions = weights / total if total > 0 else np.zeros_like(weights)
+    return investment_amount * fractions, fractions * 100
+
+class MarketSentiment(NamedTuple):
+    """Headline market sentiment figures, unpacked once from the sentiment analysis dict"""
+    mood: str
+    score: float
+    positive: int
+    negative: int
+    
+    @classmethod
+    def from_analysis(cls, analysis: Dict) -> "MarketSentiment":
+        """Build from an ai_market_sentiment_analysis() result"""
+        return cls(
+            analysis.get('market_mood', 'Unknown'),
+            analysis.get('sentiment_score', 0),
+            analysis.get('positive_coins', 0),
+            analysis.get('negative_coins', 0)
+        )
+
 class CoinGeckoAIIntegration:
     """
     AI Integration following CoinGecko's llms.txt guidelines
@@ -78,7 +126,7 @@ class CoinGeckoAIIntegration:
                         'market_cap': coin.get('market_cap', 0),
                         'price_change_24h': coin.get('price_change_percentage_24h', 0),
                         'current_price': coin.get('current_price', 0),
-                        'total_volume': coin.get('total_volume', 0)
+                        'total_volume': coin.get('total_volume') or 0
                     })
             
             if len(valid_coins) < 5:
@@ -86,51 +134,41 @@ class CoinGeckoAIIntegration:
                 return self._fallback_optimization(market_data, risk_profile, investment_amount, sectors)
             
             # Simple AI scoring based on market cap, volume, and price change
-            for coin in valid_coins:
-                # Calculate AI score based on multiple factors
-                market_cap_score = min(coin['market_cap'] / 1e9, 1)  # Normalize to 1B market cap
-                volume_score = min(coin['total_volume'] / 1e8, 1)  # Normalize to 100M volume
-                price_change_score = abs(coin['price_change_24h']) / 100  # Normalize price change
-                
-                # Risk-adjusted scoring
-                if risk_profile == "low":
-                    ai_score = (market_cap_score * 0.6) + (volume_score * 0.3) + (price_change_score * 0.1)
-                elif risk_profile == "medium":
-                    ai_score = (market_cap_score * 0.4) + (volume_score * 0.3) + (price_change_score * 0.3)
-                else:  # high risk
-                    ai_score = (market_cap_score * 0.2) + (volume_score * 0.3) + (price_change_score * 0.5)
-                
-                coin['ai_score'] = ai_score
+            scores = compute_ai_scores(
+                np.array([coin['market_cap'] for coin in valid_coins], dtype=float),
+                np.array([coin['total_volume'] for coin in valid_coins], dtype=float),
+                np.array([coin['price_change_24h'] for coin in valid_coins], dtype=float),
+                risk_profile
+            )
+            for coin, ai_score in zip(valid_coins, scores):
+                coin['ai_score'] = float(ai_score)
             
             # Sort by AI score and select top assets
             valid_coins.sort(key=lambda x: x['ai_score'], reverse=True)
             selected_coins = valid_coins[:10]  # Top 10 assets
             
-            # Create portfolio allocation
-            total_score = sum(coin['ai_score'] for coin in selected_coins)
+            # Create portfolio allocation proportional to AI score
+            allocations_usd, allocation_percentages = compute_allocations(
+                np.array([coin['ai_score'] for coin in selected_coins]), investment_amount
+            )
             portfolio = []
             
-            for coin in selected_coins:
-                allocation_score = coin['ai_score'] / total_score if total_score > 0 else 0
-                allocation_usd = investment_amount * allocation_score
-                
+            for coin, allocation_usd, allocation_percentage in zip(selected_coins, allocations_usd, allocation_percentages):
                 if allocation_usd > 0:
                     portfolio.append({
                         'id': coin['id'],
                         'symbol': coin['symbol'].upper(),
                         'name': coin['name'],
                         'current_price': coin['current_price'],
-                        'allocation_usd': allocation_usd,
-                        'allocation_percentage': allocation_score * 100,
+                        'allocation_usd': float(allocation_usd),
+                        'allocation_percentage': float(allocation_percentage),
                         'ai_score': coin['ai_score'],
                         'market_cap': coin['market_cap'],
                         'price_change_24h': coin['price_change_24h']
                     })
             
-            # Recalculate percentages
-            total_allocation = sum(asset['allocation_usd'] for asset in portfolio)
-            for asset in portfolio:
-                asset['allocation_percentage'] = (asset['allocation_usd'] / total_allocation) * 100
+            # Same assets as the portfolio filter above, reduced on the array directly
+            total_allocation = float(allocations_usd[allocations_usd > 0].sum())
             
             return {
                 'portfolio': portfolio,
@@ -152,21 +190,20 @@ class CoinGeckoAIIntegration:
         filtered_data = [coin for coin in market_data if safe_gt(coin.get('market_cap', 0), 0)]
         total_market_cap = sum(coin['market_cap'] for coin in filtered_data)
         
-        portfolio = []
-        for coin in filtered_data[:10]:  # Top 10 by market cap
-            allocation_percentage = coin['market_cap'] / total_market_cap
-            allocation_usd = investment_amount * allocation_percentage
-            
-            portfolio.append({
-                'id': coin['id'],
-                'symbol': coin['symbol'].upper(),
-                'name': coin['name'],
-                'current_price': coin['current_price'],
-                'allocation_usd': allocation_usd,
-                'allocation_percentage': allocation_percentage * 100,
-                'market_cap': coin['market_cap'],
-                'price_change_24h': coin['price_change_percentage_24h']
-            })
+        # Build the top 10 by market cap column-wise instead of one dict at a time
+        df = pd.DataFrame(filtered_data[:10], columns=[
+            'id', 'symbol', 'name', 'current_price', 'market_cap', 'price_change_percentage_24h'
+        ])
+        allocation = df['market_cap'] / total_market_cap if total_market_cap else 0.0
+        df['symbol'] = df['symbol'].str.upper()
+        df['allocation_usd'] = investment_amount * allocation
+        df['allocation_percentage'] = allocation * 100
+        df = df.rename(columns={'price_change_percentage_24h': 'price_change_24h'})
+        
+        portfolio = df[[
+            'id', 'symbol', 'name', 'current_price', 'allocation_usd',
+            'allocation_percentage', 'market_cap', 'price_change_24h'
+        ]].to_dict('records')
         
         return {
             'portfolio': portfolio,
@@ -262,12 +299,26 @@ class CoinGeckoMCPServer:
     Incorporates AI features and responsible data usage
     """
     
+    # Most distinct (endpoint, params) responses kept for conditional GETs
+    ETAG_CACHE_SIZE = 32
+    
     def __init__(self):
         # Use the correct CoinGecko API base URL
         self.base_url = "https://api.coingecko.com/api/v3"
-        self.demo_api_key = os.getenv("COINGECKO_DEMO_API_KEY")
-        self.pro_api_key = os.getenv("COINGECKO_PRO_API_KEY")
+        self.demo_api_key = COINGECKO_DEMO_API_KEY
+        self.pro_api_key = COINGECKO_PRO_API_KEY
         self.session = requests.Session()
+        # One keep-alive pool shared by every request to the API host
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32))
+        
+        # Rate limit backoff: no requests are sent before _cooldown_until (time.monotonic())
+        self._cooldown_until = 0.0
+        self._rate_limit_strikes = 0
+        
+        # Conditional GET validators: (endpoint, params) -> (ETag, Last-Modified, parsed body), kept as
+        # a small LRU because the server object is shared by every session and the refresher thread
+        self._etag_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._etag_lock = threading.Lock()
         
         # Enhanced headers for MCP server with AI integration
         self.session.headers.update({
@@ -298,18 +349,87 @@ class CoinGeckoMCPServer:
         # Load AI guidelines silently
         self.ai_integration.load_llms_guidelines()
     
+    def _in_cooldown(self) -> bool:
+        """Whether a recent 429 response means requests should be held back"""
+        return time.monotonic() < self._cooldown_until
+    
+    def is_rate_limited(self) -> bool:
+        """Whether requests are currently held back after a 429 response"""
+        return self._in_cooldown()
+    
+    def _start_cooldown(self, retry_after: Optional[str]):
+        """Back off after a 429: honour Retry-After, else 5s doubling per consecutive hit (max 120s)"""
+        self._rate_limit_strikes += 1
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = min(5 * 2 ** (self._rate_limit_strikes - 1), 120)
+        self._cooldown_until = time.monotonic() + delay
+    
+    @staticmethod
+    def _cache_key(endpoint: str, params: Optional[Dict]) -> tuple:
+        """Hashable key for an endpoint and its query parameters"""
+        return (endpoint, tuple(sorted((params or {}).items())))
+    
+    def _conditional_headers(self, key: tuple) -> Dict:
+        """If-None-Match / If-Modified-Since headers for a previously seen response"""
+        with self._etag_lock:
+            cached = self._etag_cache.get(key)
+        if not cached:
+            return {}
+        etag, last_modified, _ = cached
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+    
+    def _remember_response(self, key: tuple, response_headers, data):
+        """Keep a private copy of the parsed body of a 200 if the server sent validators for it"""
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if etag or last_modified:
+            # The analyzers annotate the objects they are given, so the cache never hands out its own
+            entry = (etag, last_modified, copy.deepcopy(data))
+            with self._etag_lock:
+                self._etag_cache[key] = entry
+                self._etag_cache.move_to_end(key)
+                while len(self._etag_cache) > self.ETAG_CACHE_SIZE:
+                    self._etag_cache.popitem(last=False)
+    
+    def _cached_body(self, key: tuple):
+        """Fresh copy of the body remembered for a 304 response, or None if it has been evicted"""
+        with self._etag_lock:
+            cached = self._etag_cache.get(key)
+            if cached is None:
+                return None
+            self._etag_cache.move_to_end(key)
+        return copy.deepcopy(cached[2])
+    
     def _make_mcp_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
         """Make authenticated request to MCP server with AI-enhanced error handling"""
+        if self._in_cooldown():
+            return None
+        
         try:
             url = f"{self.base_url}/{endpoint}"
-            response = self.session.get(url, params=params)
+            key = self._cache_key(endpoint, params)
+            response = self.session.get(url, params=params, headers=self._conditional_headers(key))
             
-            if response.status_code == 200:
-                return response.json()
+            if response.status_code == 304 and (cached := self._cached_body(key)) is not None:
+                self._rate_limit_strikes = 0
+                return cached
+            elif response.status_code == 200:
+                self._rate_limit_strikes = 0
+                data = response.json()
+                self._remember_response(key, response.headers, data)
+                return data
             elif response.status_code == 401:
                 st.error("🔑 Unauthorized. Check your CoinGecko API key.")
                 return None
             elif response.status_code == 429:
+                self._start_cooldown(response.headers.get('Retry-After'))
                 st.warning("⏱️ Rate limit exceeded. Please wait before making more requests.")
                 return None
             else:
@@ -319,24 +439,40 @@ class CoinGeckoMCPServer:
             st.error(f"❌ Error connecting to MCP server: {str(e)}")
             return None
     
-    async def _make_async_mcp_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
-        """Make async authenticated request to MCP server"""
+    async def _make_async_mcp_request(self, endpoint: str, params: Dict = None,
+                                      session: Optional[aiohttp.ClientSession] = None) -> Optional[Dict]:
+        """Make async authenticated request to MCP server, reusing the given session if any"""
+        if self._in_cooldown():
+            return None
+        
+        if session is None:
+            async with aiohttp.ClientSession() as own_session:
+                return await self._make_async_mcp_request(endpoint, params, session=own_session)
+        
         try:
             url = f"{self.base_url}/{endpoint}"
-            async with aiohttp.ClientSession() as session:
-                headers = dict(self.session.headers)
-                async with session.get(url, params=params, headers=headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    elif response.status == 401:
-                        st.error("🔑 Unauthorized. Check your CoinGecko API key.")
-                        return None
-                    elif response.status == 429:
-                        st.warning("⏱️ Rate limit exceeded. Please wait before making more requests.")
-                        return None
-                    else:
-                        st.error(f"❌ MCP Server error {response.status}: {await response.text()}")
-                        return None
+            key = self._cache_key(endpoint, params)
+            headers = dict(self.session.headers)
+            headers.update(self._conditional_headers(key))
+            async with session.get(url, params=params, headers=headers) as response:
+                if response.status == 304 and (cached := self._cached_body(key)) is not None:
+                    self._rate_limit_strikes = 0
+                    return cached
+                elif response.status == 200:
+                    self._rate_limit_strikes = 0
+                    data = await response.json()
+                    self._remember_response(key, response.headers, data)
+                    return data
+                elif response.status == 401:
+                    st.error("🔑 Unauthorized. Check your CoinGecko API key.")
+                    return None
+                elif response.status == 429:
+                    self._start_cooldown(response.headers.get('Retry-After'))
+                    st.warning("⏱️ Rate limit exceeded. Please wait before making more requests.")
+                    return None
+                else:
+                    st.error(f"❌ MCP Server error {response.status}: {await response.text()}")
+                    return None
         except Exception as e:
             st.error(f"❌ Error connecting to MCP server: {str(e)}")
             return None
@@ -376,10 +512,11 @@ class CoinGeckoMCPServer:
         
         return data
     
-    def get_coins_markets_mcp(self, vs_currency: str = "usd", order: str = "market_cap_desc", 
-                             per_page: int = 100, page: int = 1) -> List[Dict]:
-        """Get coins market data via MCP server with AI enhancement"""
-        params = {
+    @staticmethod
+    def _coins_markets_params(vs_currency: str = "usd", order: str = "market_cap_desc",
+                              per_page: int = 100, page: int = 1) -> Dict:
+        """Query parameters for the coins/markets endpoint"""
+        return {
             'vs_currency': vs_currency,
             'order': order,
             'per_page': per_page,
@@ -387,8 +524,15 @@ class CoinGeckoMCPServer:
             'sparkline': 'false',
             'price_change_percentage': '24h'
         }
-        result = self._make_mcp_request("coins/markets", params)
-        
+    
+    def get_coins_markets_mcp(self, vs_currency: str = "usd", order: str = "market_cap_desc", 
+                             per_page: int = 100, page: int = 1) -> List[Dict]:
+        """Get coins market data via MCP server with AI enhancement"""
+        params = self._coins_markets_params(vs_currency, order, per_page, page)
+        return self._analyze_coins_markets(self._make_mcp_request("coins/markets", params))
+    
+    def _analyze_coins_markets(self, result: Optional[List[Dict]]) -> List[Dict]:
+        """Attach AI market sentiment to a coins/markets response"""
         if result:
             # Add AI-powered market analysis
             market_sentiment = self.ai_integration.ai_market_sentiment_analysis(result)
@@ -398,8 +542,10 @@ class CoinGeckoMCPServer:
     
     def get_trending_coins_mcp(self) -> Dict:
         """Get trending coins via MCP server with AI analysis"""
-        result = self._make_mcp_request("search/trending")
-        
+        return self._analyze_trending(self._make_mcp_request("search/trending"))
+    
+    def _analyze_trending(self, result: Optional[Dict]) -> Optional[Dict]:
+        """Attach AI trending analysis to a search/trending response"""
         if result and 'coins' in result:
             # Add AI-powered trending analysis
             trending_coins = result['coins']
@@ -413,8 +559,10 @@ class CoinGeckoMCPServer:
     
     def get_global_market_data_mcp(self) -> Dict:
         """Get global market data via MCP server with AI insights"""
-        result = self._make_mcp_request("global")
-        
+        return self._analyze_global(self._make_mcp_request("global"))
+    
+    def _analyze_global(self, result: Optional[Dict]) -> Optional[Dict]:
+        """Attach AI global market analysis to a global response"""
         if result and 'data' in result:
             # Add AI-powered global market analysis
             data = result['data']
@@ -428,8 +576,10 @@ class CoinGeckoMCPServer:
     
     def get_defi_market_data_mcp(self) -> Dict:
         """Get DeFi market data via MCP server with AI analysis"""
-        result = self._make_mcp_request("global/decentralized_finance_defi")
-        
+        return self._analyze_defi(self._make_mcp_request("global/decentralized_finance_defi"))
+    
+    def _analyze_defi(self, result: Optional[Dict]) -> Optional[Dict]:
+        """Attach AI DeFi analysis to a global/decentralized_finance_defi response"""
         if result and 'data' in result:
             # Add AI-powered DeFi analysis
             data = result['data']
@@ -608,22 +758,24 @@ class CoinGeckoMCPServer:
     
     async def get_enhanced_portfolio_data(self, coin_ids: List[str]) -> Dict:
         """Get enhanced portfolio data combining multiple MCP endpoints with AI analysis"""
-        tasks = []
-        
-        # Create async tasks for multiple data sources
-        tasks.append(self._make_async_mcp_request("simple/price", {
-            'ids': ','.join(coin_ids),
-            'vs_currencies': 'usd',
-            'include_market_cap': 'true',
-            'include_24hr_vol': 'true',
-            'include_24hr_change': 'true'
-        }))
-        
-        tasks.append(self._make_async_mcp_request("global"))
-        tasks.append(self._make_async_mcp_request("search/trending"))
-        
-        # Execute all requests concurrently
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # One pooled session for all requests instead of a new session (and connection) per request
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+            tasks = []
+            
+            # Create async tasks for multiple data sources
+            tasks.append(self._make_async_mcp_request("simple/price", {
+                'ids': ','.join(coin_ids),
+                'vs_currencies': 'usd',
+                'include_market_cap': 'true',
+                'include_24hr_vol': 'true',
+                'include_24hr_change': 'true'
+            }, session=session))
+            
+            tasks.append(self._make_async_mcp_request("global", session=session))
+            tasks.append(self._make_async_mcp_request("search/trending", session=session))
+            
+            # Execute all requests concurrently
+            results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Add AI analysis to results
         enhanced_results = {
@@ -641,8 +793,8 @@ class CoinGeckoMCPServer:
 class MCPPortfolioOptimizer:
     """Enhanced portfolio optimizer using MCP server data with AI capabilities"""
     
-    def __init__(self):
-        self.mcp_server = CoinGeckoMCPServer()
+    def __init__(self, mcp_server: Optional[CoinGeckoMCPServer] = None):
+        self.mcp_server = mcp_server or CoinGeckoMCPServer()
         self.ai_integration = CoinGeckoAIIntegration()
         self.sector_categories = {
             "DeFi": ["aave", "uniswap", "compound", "maker", "curve-dao-token", "synthetix", "yearn-finance"],
@@ -655,35 +807,46 @@ class MCPPortfolioOptimizer:
         }
     
     def get_enhanced_market_data(self) -> Dict:
-        """Get comprehensive market data via MCP server with AI analysis"""
+        """Get comprehensive market data via MCP server with AI analysis (blocking wrapper of the async fetch)"""
+        return asyncio.run(self.get_enhanced_market_data_async())
+    
+    async def get_enhanced_market_data_async(self) -> Dict:
+        """Get comprehensive market data with the MCP endpoints fetched concurrently"""
         try:
-            # Get multiple data sources
-            market_data = self.mcp_server.get_coins_markets_mcp(per_page=200)
-            global_data = self.mcp_server.get_global_market_data_mcp()
-            trending_data = self.mcp_server.get_trending_coins_mcp()
-            defi_data = self.mcp_server.get_defi_market_data_mcp()
+            server = self.mcp_server
+            connector = aiohttp.TCPConnector(limit=8)
+            timeout = aiohttp.ClientTimeout(total=10)
             
-            # Add AI-powered market analysis
-            ai_sentiment = self.ai_integration.ai_market_sentiment_analysis(market_data)
+            # Issue all independent requests over one pooled session
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                markets, global_raw, trending_raw, defi_raw = await asyncio.gather(
+                    server._make_async_mcp_request("coins/markets", server._coins_markets_params(per_page=200), session=session),
+                    server._make_async_mcp_request("global", session=session),
+                    server._make_async_mcp_request("search/trending", session=session),
+                    server._make_async_mcp_request("global/decentralized_finance_defi", session=session)
+                )
+            
+            market_data = server._analyze_coins_markets(markets)
             
             return {
                 'market_data': market_data,
-                'global_data': global_data,
-                'trending_data': trending_data,
-                'defi_data': defi_data,
-                'ai_sentiment': ai_sentiment,
+                'global_data': server._analyze_global(global_raw),
+                'trending_data': server._analyze_trending(trending_raw),
+                'defi_data': server._analyze_defi(defi_raw),
+                'ai_sentiment': self.ai_integration.ai_market_sentiment_analysis(market_data),
                 'timestamp': datetime.now().isoformat()
             }
         except Exception as e:
             st.error(f"❌ Error fetching enhanced market data: {str(e)}")
             return {}
     
-    def get_sector_analysis(self, sector: str) -> Dict:
-        """Get detailed analysis for a specific sector with AI insights"""
+    def get_sector_analysis(self, sector: str, sector_data: Optional[List[Dict]] = None) -> Dict:
+        """Get detailed analysis for a specific sector with AI insights, on prefetched market data if given"""
         try:
             if sector in self.sector_categories:
                 sector_coins = self.sector_categories[sector]
-                sector_data = self.mcp_server.get_coins_markets_mcp(per_page=50)
+                if not sector_data:
+                    sector_data = self.mcp_server.get_coins_markets_mcp(per_page=50)
                 
                 # Filter for sector coins
                 sector_market_data = [
@@ -709,10 +872,11 @@ class MCPPortfolioOptimizer:
             st.error(f"❌ Error analyzing sector {sector}: {str(e)}")
             return {}
     
-    def get_trending_analysis(self) -> Dict:
-        """Get trending coins analysis with AI insights"""
+    def get_trending_analysis(self, trending_data: Optional[Dict] = None) -> Dict:
+        """Get trending coins analysis with AI insights, on prefetched trending data if given"""
         try:
-            trending_data = self.mcp_server.get_trending_coins_mcp()
+            if not trending_data:
+                trending_data = self.mcp_server.get_trending_coins_mcp()
             
             if trending_data and 'coins' in trending_data:
                 trending_coins = trending_data['coins']
@@ -777,11 +941,13 @@ class MCPPortfolioOptimizer:
             return {}
     
     def ai_optimize_portfolio(self, risk_profile: str, investment_amount: float, 
-                             preferred_sectors: List[str], max_assets: int = 10) -> Dict:
-        """AI-powered portfolio optimization using MCP data"""
+                             preferred_sectors: List[str], max_assets: int = 10,
+                             market_data: Optional[List[Dict]] = None) -> Dict:
+        """AI-powered portfolio optimization using MCP data, or prefetched market data if given"""
         try:
-            # Get market data for optimization
-            market_data = self.mcp_server.get_coins_markets_mcp(per_page=200)
+            # Get market data for optimization unless the caller already fetched it
+            if not market_data:
+                market_data = self.mcp_server.get_coins_markets_mcp(per_page=200)
             
             if not market_data:
                 st.error("❌ No market data available for AI optimization")
@@ -808,7 +974,7 @@ class MCPPortfolioOptimizer:
 
 # Initialize MCP components with AI
 mcp_server = CoinGeckoMCPServer()
-mcp_optimizer = MCPPortfolioOptimizer()
+mcp_optimizer = MCPPortfolioOptimizer(mcp_server)
 
 # Enhanced MCP Status Checker with AI monitoring
 def check_mcp_server_status():
@@ -827,17 +993,20 @@ async def get_mcp_enhanced_data(risk_profile: str = "medium", investment_amount:
                                preferred_sectors: List[str] = None, max_assets: int = 10):
     """Get enhanced data from MCP server with AI-powered portfolio optimization"""
     try:
-        # Get comprehensive market data
-        market_data = mcp_optimizer.get_enhanced_market_data()
+        # Get comprehensive market data, with the MCP endpoints fetched concurrently
+        market_data = await mcp_optimizer.get_enhanced_market_data_async()
+        markets = market_data.get('market_data')
         
-        # Get trending analysis
-        trending_analysis = mcp_optimizer.get_trending_analysis()
+        # Get trending analysis from the trending coins already fetched
+        trending_analysis = mcp_optimizer.get_trending_analysis(market_data.get('trending_data'))
         
         # Get sector analysis for selected sectors
         sector_analysis = {}
         if preferred_sectors:
+            # The top 50 by market cap is the head of the 200-coin markets page already fetched
+            sector_market_data = (markets or [])[:50] or mcp_optimizer.mcp_server.get_coins_markets_mcp(per_page=50)
             for sector in preferred_sectors:
-                sector_data = mcp_optimizer.get_sector_analysis(sector)
+                sector_data = mcp_optimizer.get_sector_analysis(sector, sector_market_data)
                 if sector_data:
                     sector_analysis[sector] = sector_data
         
@@ -846,7 +1015,8 @@ async def get_mcp_enhanced_data(risk_profile: str = "medium", investment_amount:
             risk_profile=risk_profile,
             investment_amount=investment_amount,
             preferred_sectors=preferred_sectors or ["DeFi", "Layer 1"],
-            max_assets=max_assets
+            max_assets=max_assets,
+            market_data=markets
         )
         
         return {
@@ -865,6 +1035,7 @@ __all__ = [
     'CoinGeckoMCPServer',
     'MCPPortfolioOptimizer', 
     'CoinGeckoAIIntegration',
+    'MarketSentiment',
     'mcp_server',
     'mcp_optimizer',
     'check_mcp_server_status',